@@ -3,12 +3,227 @@ Content Understanding Agent using Microsoft Agent Framework.
 This agent orchestrates document processing workflows using Azure Functions.
 """
 import os
+import queue
+import atexit
+import asyncio
+import logging
+import logging.handlers
+import json
+import re
+import time
+import hashlib
+import diskcache
+from dataclasses import dataclass
+from typing import Final, Optional
+from pathlib import Path
 from dotenv import load_dotenv
-from azure.ai.projects import AIProjectClient
-from azure.ai.agents.models import FunctionTool, ToolSet
-from azure.identity import DefaultAzureCredential
-import function_tools
-import validation_tools
+import aiohttp
+from azure.core.exceptions import ResourceNotFoundError
+from azure.core.pipeline.transport import AioHttpTransport
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+from azure.ai.projects.aio import AIProjectClient
+from azure.ai.agents.models import AsyncFunctionTool, AsyncToolSet, ListSortOrder, MessageDeltaChunk, ThreadRun
+from azure.identity.aio import DefaultAzureCredential
+import tools_async
+
+
+_log = logging.getLogger(__name__)
+_LOG_LISTENER = None
+
+
+def configure_logging(level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """
+    Route log records through a queue so logging calls never block on stream I/O.
+    
+    Safe to call more than once (e.g. on every Streamlit rerun); only the first call
+    installs the handlers.
+    """
+    global _LOG_LISTENER
+    if _LOG_LISTENER is None:
+        log_queue = queue.Queue(-1)
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        _LOG_LISTENER = logging.handlers.QueueListener(log_queue, stream_handler)
+        logging.basicConfig(level=level, handlers=[logging.handlers.QueueHandler(log_queue)])
+        _LOG_LISTENER.start()
+        atexit.register(_LOG_LISTENER.stop)
+    return _LOG_LISTENER
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Agent settings read once from the environment / .env file at import time."""
+    project_endpoint: Optional[str]
+    model_deployment: str
+    max_concurrency: int
+    max_rps: float
+
+
+load_dotenv()
+_CFG = Config(
+    project_endpoint=os.getenv("PROJECT_ENDPOINT"),
+    model_deployment=os.getenv("MODEL_DEPLOYMENT_NAME", "gpt-4o"),
+    max_concurrency=int(os.getenv("AGENT_MAX_CONCURRENCY", "8")),
+    max_rps=float(os.getenv("AGENT_MAX_RPS", "2"))
+)
+
+# Processed results are deterministic per document, classifier and model, so keep them for a week
+RESULT_CACHE_DIR = ".ocr_cache"
+RESULT_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# Maximum number of documents sent to the agent in a single run
+BATCH_SIZE = 10
+
+# Agent instructions and workflow prompts never change, so they live at module scope
+_AGENT_INSTRUCTIONS: Final[str] = """You are a document processing agent that orchestrates workflows using Azure Functions.
+
+Your workflow for processing documents:
+1. Call process_document_full with the document filename
+   - This runs OCR and creates the summary and the Excel report in a single call
+   - If it fails, fall back to perform_ocr followed by parse_ocr_and_create_excel with the
+     OCR result blob name; use parse_ocr or create_excel on their own only to retry the one that failed
+2. VALIDATE DATA: Use validate_ocr_and_parse to compare the OCR result with the parsed summary
+   - This downloads both files and checks that the summary contains data from the OCR
+   - Reports any issues like missing data or empty summaries
+   - Provides specific validation checks and recommendations
+3. If validation passes, call clean_up with the original document filename
+
+When asked to process several documents at once, call perform_ocr_parallel once with all of
+their filenames instead of calling perform_ocr for each, then continue the workflow for each
+document using its own OCR result.
+
+For data validation:
+- ALWAYS use validate_ocr_and_parse after the summary and Excel report are created
+- Pass both the OCR result blob name and the summary blob name from step 1
+- Review the validation checks and issues reported
+- If validation fails, report the issues, mark the Excel report as unvalidated, and do not proceed to cleanup
+
+You also have access to:
+- get_ocr_result_content: Download and inspect OCR JSON content
+- get_parsed_summary_content: Download and inspect parsed summary text
+
+Always provide clear status updates about each step and handle errors gracefully.
+If any step fails, do not proceed to cleanup.
+
+When answering questions about processed documents:
+- Use the function results to answer questions about patient information, expenses, dates, etc.
+- Provide specific details from the OCR results when available"""
+
+_PROCESS_PROMPT_TEMPLATE: Final[str] = """Please process the document '{document_filename}' using classifier '{classifier_id}'.
+        
+Follow the complete workflow:
+1. Process the document (OCR, summary and Excel report) with process_document_full
+2. Validate the data
+3. Clean up the original file
+
+Provide status updates for each step and the final results."""
+
+_BATCH_PROCESS_PROMPT_TEMPLATE: Final[str] = """Please process the following documents using classifier '{classifier_id}':
+{document_list}
+
+Process the documents in parallel, calling perform_ocr_parallel once with all of the filenames.
+Then, for every document, follow the complete workflow:
+1. Perform OCR
+2. Parse the OCR results and create the Excel report together
+3. Validate the data
+4. Clean up the original file
+
+Provide status updates for each document and step, and the final results."""
+
+_BATCH_QUERY_PROMPT_TEMPLATE: Final[str] = """Answer the following {count} questions in order, using the already-processed document:
+{question_list}
+
+Start each answer with a header line of its own naming the question, e.g. "### Q1", "### Q2", ...,
+and put nothing else on that line."""
+
+# Matches the "### Q<n>" header before each batch answer; a plain "1." would also match
+# numbered lists inside an answer, such as an itemized expense list
+_ANSWER_HEADER_RE: Final[re.Pattern] = re.compile(r"^[ \t]*###[ \t]*Q(\d+)[ \t]*$", re.MULTILINE)
+
+# Define the functions that the agent can use; all of them are async so a long OCR run or
+# blob download does not block the shared event loop
+_USER_FUNCTIONS = frozenset({
+    tools_async.process_document_full,
+    tools_async.perform_ocr,
+    tools_async.perform_ocr_parallel,
+    tools_async.parse_ocr,
+    tools_async.create_excel,
+    tools_async.parse_ocr_and_create_excel,
+    tools_async.clean_up,
+    tools_async.get_ocr_result_content,
+    tools_async.get_parsed_summary_content,
+    tools_async.validate_ocr_and_parse
+})
+
+# Build the tool schemas once; every agent instance shares the same toolset
+_FUNCTION_TOOL = AsyncFunctionTool(functions=_USER_FUNCTIONS)
+_TOOLSET = AsyncToolSet()
+_TOOLSET.add(_FUNCTION_TOOL)
+
+# Keep-alive connections shared by every project client in the process
+HTTP_POOL_SIZE = 32
+
+# Shared so the token cache survives across agent instances. Only the Environment,
+# Managed Identity and Azure CLI probes are useful here, so skip the slow unused ones.
+_CREDENTIAL = DefaultAzureCredential(
+    exclude_interactive_browser_credential=True,
+    exclude_visual_studio_code_credential=True,
+    exclude_shared_token_cache_credential=True,
+    exclude_powershell_credential=True
+)
+_HTTP_SESSION = None
+
+
+def _get_transport() -> AioHttpTransport:
+    """Return a transport backed by the process-wide keep-alive aiohttp session."""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None or _HTTP_SESSION.closed:
+        _HTTP_SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE)
+        )
+    return AioHttpTransport(session=_HTTP_SESSION, session_owner=False)
+
+
+# Wait hint in a rate limit error, e.g. "Rate limit is exceeded. Try again in 20 seconds."
+_RETRY_AFTER_RE: Final[re.Pattern] = re.compile(r"(?:try again in|retry after) (\d+) second", re.IGNORECASE)
+_MAX_RETRY_AFTER_SECONDS = 60
+
+_backoff = wait_exponential_jitter(initial=1, max=30)
+
+
+class _RateLimitedRun(Exception):
+    """A run that finished as failed because the model was rate limited; raised so it is retried."""
+    
+    def __init__(self, run):
+        super().__init__(f"Run rate limited: {run.last_error}")
+        self.run = run
+
+
+def _run_rate_limited(run) -> bool:
+    """Return True if a run failed on the model's rate limit rather than on its own."""
+    return run.status == "failed" and getattr(run.last_error, "code", None) == "rate_limit_exceeded"
+
+
+def _wait_for_rate_limit(retry_state) -> float:
+    """Honor the error's 'try again in N seconds' hint (capped), else back off exponentially with jitter."""
+    wait_match = _RETRY_AFTER_RE.search(str(retry_state.outcome.exception()))
+    if wait_match:
+        return min(int(wait_match.group(1)), _MAX_RETRY_AFTER_SECONDS)
+    return _backoff(retry_state)
+
+
+def _is_rate_limited(error: BaseException) -> bool:
+    """Return True for 429 / rate limit / quota errors worth retrying."""
+    if isinstance(error, _RateLimitedRun):
+        return True
+    status_code = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status_code is None and response is not None:
+        status_code = getattr(response, "status_code", None)
+    if status_code == 429:
+        return True
+    error_str = str(error).lower()
+    return "rate limit" in error_str or "rate_limit" in error_str or "quota" in error_str
 
 
 class ContentUnderstandingAgent:
@@ -20,164 +235,380 @@ class ContentUnderstandingAgent:
     2. Parse and validate OCR results
     3. Create Excel reports
     4. Clean up processed files
+    
+    The project client is asynchronous, so instances are built with the
+    ``create()`` factory rather than by calling the class directly.
     """
     
     def __init__(self, agent_name: str = "content-understanding-agent"):
-        """Initialize the agent with Azure AI Foundry project connection."""
-        load_dotenv()
-        
+        """Set up the Azure AI Foundry project connection. Use ``create()`` to get a ready agent."""
         self.agent_name = agent_name
-        self.project_endpoint = os.getenv("PROJECT_ENDPOINT")
-        self.model_deployment = os.getenv("MODEL_DEPLOYMENT_NAME", "gpt-4o")
+        self.project_endpoint = _CFG.project_endpoint
+        self.model_deployment = _CFG.model_deployment
         
         if not self.project_endpoint:
             raise ValueError("PROJECT_ENDPOINT environment variable is required")
         
-        # Create project client
+        # Create project client on the shared credential and connection pool
         self.project_client = AIProjectClient(
             endpoint=self.project_endpoint,
-            credential=DefaultAzureCredential()
+            credential=_CREDENTIAL,
+            transport=_get_transport()
         )
         
-        # Define the functions that the agent can use
-        user_functions = {
-            function_tools.perform_ocr,
-            function_tools.parse_ocr,
-            function_tools.create_excel,
-            function_tools.clean_up,
-            validation_tools.get_ocr_result_content,
-            validation_tools.get_parsed_summary_content,
-            validation_tools.validate_ocr_and_parse
-        }
+        # Enable automatic function calls
+        self.toolset = _TOOLSET
+        self.project_client.agents.enable_auto_function_calls(self.toolset)
         
-        # Create toolset with function tools
-        functions = FunctionTool(functions=user_functions)
-        toolset = ToolSet()
-        toolset.add(functions)
+        # Bound concurrent agent runs and space out their start times
+        self._sem = asyncio.Semaphore(_CFG.max_concurrency)
+        self._min_interval = 1.0 / _CFG.max_rps
+        self._next_ok_time = 0.0
         
-        # Enable automatic function calls
-        self.project_client.agents.enable_auto_function_calls(toolset)
+        # Disk-backed cache of processed results keyed by document content
+        self.result_cache = diskcache.Cache(RESULT_CACHE_DIR)
+        
+        self.agent = None
+    
+    @classmethod
+    async def create(cls, agent_name: str = "content-understanding-agent") -> "ContentUnderstandingAgent":
+        """Create the agent wrapper and find or create the agent in the project."""
+        instance = cls(agent_name)
         
         # Try to find existing agent by name
-        self.agent = self._find_or_create_agent(toolset)
+        instance.agent = await instance._find_or_create_agent(instance.toolset)
         
-        print(f"✅ Using agent: {self.agent.id} (name: {self.agent_name})")
+        _log.info("✅ Using agent: %s (name: %s)", instance.agent.id, instance.agent_name)
+        return instance
+    
+    @property
+    def _agent_id_file(self) -> Path:
+        """Local file remembering the resolved agent ID for this agent name."""
+        return Path(f".agent-{self.agent_name}.id")
+    
+    def _load_agent_id(self):
+        """Return the remembered agent ID if it belongs to the same endpoint and model."""
+        try:
+            saved = json.loads(self._agent_id_file.read_text())
+        except (OSError, ValueError):
+            return None
+        if saved.get("project_endpoint") != self.project_endpoint or saved.get("model_deployment") != self.model_deployment:
+            return None
+        return saved.get("agent_id")
+    
+    def _save_agent_id(self, agent_id: str):
+        """Remember the resolved agent ID so later instances can skip the agent listing."""
+        try:
+            self._agent_id_file.write_text(json.dumps({
+                "project_endpoint": self.project_endpoint,
+                "model_deployment": self.model_deployment,
+                "agent_id": agent_id
+            }))
+        except OSError as e:
+            _log.warning("⚠️ Could not save agent ID: %s", e)
     
-    def _find_or_create_agent(self, toolset: ToolSet):
-        """Find existing agent by name or create new one."""
+    async def _sync_agent_definition(self, agent, toolset: AsyncToolSet):
+        """Update a reused agent whose model, instructions or tools differ from this version of the code."""
+        def normalized(definitions) -> list:
+            # The toolset is built from a frozenset, so compare definitions independent of order
+            return sorted(json.dumps(d.as_dict(), sort_keys=True) for d in definitions or [])
+        
+        if agent.model == self.model_deployment and agent.instructions == _AGENT_INSTRUCTIONS and \
+                normalized(agent.tools) == normalized(toolset.definitions):
+            return agent
+        
+        _log.info("🔄 Updating agent %s to the current model, instructions and tools", agent.id)
+        return await self.project_client.agents.update_agent(
+            agent.id,
+            model=self.model_deployment,
+            instructions=_AGENT_INSTRUCTIONS,
+            toolset=toolset
+        )
+    
+    async def _find_agent(self):
+        """Return the saved or same-named agent from the project, or None."""
+        # Use the remembered agent ID directly if it still exists
+        agent_id = self._load_agent_id()
+        if agent_id:
+            try:
+                agent = await self.project_client.agents.get_agent(agent_id)
+                _log.info("♻️ Found saved agent: %s", agent.id)
+                return agent
+            except ResourceNotFoundError:
+                _log.warning("⚠️ Saved agent %s no longer exists", agent_id)
+            except Exception as e:
+                _log.warning("⚠️ Could not get saved agent: %s", e)
+        
         # List all agents
         try:
             agents = self.project_client.agents.list_agents()
             
             # Look for agent with matching name
-            for agent in agents:
+            async for agent in agents:
                 if agent.name == self.agent_name:
-                    print(f"♻️ Found existing agent: {agent.id}")
+                    _log.info("♻️ Found existing agent: %s", agent.id)
+                    self._save_agent_id(agent.id)
                     return agent
         except Exception as e:
-            print(f"⚠️ Could not list agents: {e}")
+            _log.warning("⚠️ Could not list agents: %s", e)
+        return None
+    
+    async def _find_or_create_agent(self, toolset: AsyncToolSet):
+        """Find existing agent by name or create new one, bringing a reused agent up to date."""
+        agent = await self._find_agent()
+        if agent is not None:
+            return await self._sync_agent_definition(agent, toolset)
         
         # Create new agent if not found
-        print(f"🆕 Creating new agent: {self.agent_name}")
-        return self.project_client.agents.create_agent(
+        _log.info("🆕 Creating new agent: %s", self.agent_name)
+        agent = await self.project_client.agents.create_agent(
             model=self.model_deployment,
             name=self.agent_name,
-            instructions="""You are a document processing agent that orchestrates workflows using Azure Functions.
-
-Your workflow for processing documents:
-1. Call perform_ocr with the document filename to extract text and data
-2. Call parse_ocr with the OCR result blob name to create a summary
-3. VALIDATE DATA: Use validate_ocr_and_parse to compare the OCR result with the parsed summary
-   - This downloads both files and checks that the summary contains data from the OCR
-   - Reports any issues like missing data or empty summaries
-   - Provides specific validation checks and recommendations
-4. If validation passes, call create_excel with the OCR result blob name
-5. After successful Excel creation, call clean_up with the original document filename
-
-For data validation:
-- ALWAYS use validate_ocr_and_parse after parse_ocr completes
-- Pass both the OCR result blob name (from step 1) and summary blob name (from step 2)
-- Review the validation checks and issues reported
-- Only proceed to Excel creation if validation passes
-- If validation fails, report the issues and do not proceed to cleanup
-
-You also have access to:
-- get_ocr_result_content: Download and inspect OCR JSON content
-- get_parsed_summary_content: Download and inspect parsed summary text
-
-Always provide clear status updates about each step and handle errors gracefully.
-If any step fails, do not proceed to cleanup.
-
-When answering questions about processed documents:
-- Use the function results to answer questions about patient information, expenses, dates, etc.
-- Provide specific details from the OCR results when available""",
+            instructions=_AGENT_INSTRUCTIONS,
             toolset=toolset
         )
+        self._save_agent_id(agent.id)
+        return agent
+    
+    def cache_key(self, file_bytes: bytes, classifier_id: str = "prebuilt-documentAnalyzer") -> str:
+        """Build the result cache key from the document bytes (or a buffer), classifier and model deployment."""
+        digest = hashlib.sha256(file_bytes)
+        digest.update(classifier_id.encode())
+        digest.update(self.model_deployment.encode())
+        return digest.hexdigest()
+    
+    def get_cached_result(self, key: str):
+        """Return a previously stored process_document result (without a thread), or None."""
+        return self.result_cache.get(key)
+    
+    def cache_result(self, key: str, result: dict):
+        """Store a successful process_document result; its thread is not kept, as it belongs to one conversation."""
+        if result.get("success"):
+            shared = {k: v for k, v in result.items() if k != "thread_id"}
+            self.result_cache.set(key, shared, expire=RESULT_CACHE_TTL_SECONDS)
+    
+    async def start_thread_from_result(self, result: dict) -> str:
+        """
+        Start a new thread seeded with a cached processing result, so every conversation
+        about the document gets its own thread with the document context.
+        
+        Returns:
+            The new thread ID
+        """
+        thread = await self.project_client.agents.threads.create()
+        await self.project_client.agents.messages.create(
+            thread_id=thread.id,
+            role="assistant",
+            content="\n\n".join(result.get("responses") or ["The document was processed earlier."])
+        )
+        _log.debug("📝 Created thread %s from a cached result", thread.id)
+        return thread.id
+    
+    async def _respect_rps(self):
+        """Wait until the next run is allowed to start under AGENT_MAX_RPS."""
+        now = time.monotonic()
+        start_at = max(now, self._next_ok_time)
+        self._next_ok_time = start_at + self._min_interval
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+    
+    async def _create_and_process(self, thread_id: str):
+        """
+        Run the agent on a thread with bounded concurrency, rate limiting and rate limit retries.
+        
+        Both a raised 429 and a run that comes back failed with rate_limit_exceeded are
+        retried; once retries run out the failed run is returned like any other.
+        """
+        async with self._sem:
+            try:
+                async for attempt in AsyncRetrying(
+                    wait=_wait_for_rate_limit,
+                    stop=stop_after_attempt(3),
+                    retry=retry_if_exception(_is_rate_limited),
+                    reraise=True
+                ):
+                    with attempt:
+                        await self._respect_rps()
+                        run = await self.project_client.agents.runs.create_and_process(
+                            thread_id=thread_id,
+                            agent_id=self.agent.id
+                        )
+                        if _run_rate_limited(run):
+                            raise _RateLimitedRun(run)
+                        return run
+            except _RateLimitedRun as e:
+                return e.run
     
-    def process_document(self, document_filename: str, classifier_id: str = "prebuilt-documentAnalyzer") -> dict:
+    async def process_document(
+        self,
+        document_filename: str,
+        classifier_id: str = "prebuilt-documentAnalyzer",
+        return_all_responses: bool = True
+    ) -> dict:
         """
         Process a document through the complete workflow.
         
         Args:
             document_filename: Name of the document in incoming-docs container
             classifier_id: Azure Content Understanding classifier to use
+            return_all_responses: Return every assistant message; if False only
+                                  the final summary is fetched
             
         Returns:
             Dictionary with workflow results
         """
-        # Create a thread for this conversation
-        thread = self.project_client.agents.threads.create()
-        print(f"📝 Created thread: {thread.id}")
-        
         # Send the processing request
-        prompt = f"""Please process the document '{document_filename}' using classifier '{classifier_id}'.
+        prompt = _PROCESS_PROMPT_TEMPLATE.format(
+            document_filename=document_filename,
+            classifier_id=classifier_id
+        )
         
-Follow the complete workflow:
-1. Perform OCR
-2. Parse the OCR results
-3. Validate the data
-4. Create Excel report
-5. Clean up the original file
-
-Provide status updates for each step and the final results."""
+        return await self._run_workflow(prompt, return_all_responses)
+    
+    async def process_documents(self, document_filenames: list, classifier_id: str = "prebuilt-documentAnalyzer") -> list:
+        """
+        Process several documents, sending up to BATCH_SIZE filenames per agent run.
         
-        message = self.project_client.agents.messages.create(
+        The agent is asked to OCR every document in a batch at once through
+        perform_ocr_parallel, and the batches themselves run concurrently.
+        
+        Args:
+            document_filenames: Names of the documents in incoming-docs container
+            classifier_id: Azure Content Understanding classifier to use
+            
+        Returns:
+            List of workflow result dictionaries, one per batch, each with a
+            "documents" key listing the filenames it covered
+        """
+        batches = [
+            document_filenames[i:i + BATCH_SIZE]
+            for i in range(0, len(document_filenames), BATCH_SIZE)
+        ]
+        
+        async def run_batch(batch):
+            prompt = _BATCH_PROCESS_PROMPT_TEMPLATE.format(
+                document_list=json.dumps(batch),
+                classifier_id=classifier_id
+            )
+            result = await self._run_workflow(prompt)
+            result["documents"] = batch
+            return result
+        
+        return list(await asyncio.gather(*(run_batch(batch) for batch in batches)))
+    
+    async def _run_workflow(self, prompt: str, return_all_responses: bool = True) -> dict:
+        """Run the agent on a new thread with the given prompt and collect its responses."""
+        # Create a thread for this conversation
+        thread = await self.project_client.agents.threads.create()
+        _log.debug("📝 Created thread: %s", thread.id)
+        
+        message = await self.project_client.agents.messages.create(
             thread_id=thread.id,
             role="user",
             content=prompt
         )
         
         # Run the agent
-        print("🤖 Starting agent run...")
-        run = self.project_client.agents.runs.create_and_process(
-            thread_id=thread.id,
-            agent_id=self.agent.id
-        )
+        _log.info("🤖 Starting agent run...")
+        run = await self._create_and_process(thread.id)
         
-        print(f"✅ Run completed with status: {run.status}")
+        _log.info("✅ Run completed with status: %s", run.status)
         
         if run.status == "failed":
-            print(f"❌ Run failed: {run.last_error}")
+            _log.error("❌ Run failed: %s", run.last_error)
             return {"success": False, "error": run.last_error}
         
-        # Get all messages from the thread
-        messages = self.project_client.agents.messages.list(thread_id=thread.id)
-        
-        # Extract the agent's responses
-        responses = []
-        for msg in messages:
-            if msg.role == "assistant":
-                for content in msg.content:
-                    if hasattr(content, 'text') and content.text:
-                        responses.append(content.text.value)
-        
         return {
             "success": True,
             "thread_id": thread.id,
-            "responses": responses
+            "responses": await self._collect_responses(thread.id, run.id, return_all_responses)
         }
     
-    def query(self, question: str, thread_id: str = None) -> str:
+    async def stream_document(self, document_filename: str, classifier_id: str = "prebuilt-documentAnalyzer", result: dict = None):
+        """
+        Process a document like process_document, yielding progress text as the run streams.
+        
+        Yields the agent's text deltas as they arrive and a short line for every tool the
+        agent calls. Unlike process_document, a rate-limited run is not retried because
+        part of it may already have been shown.
+        
+        Args:
+            document_filename: Name of the document in incoming-docs container
+            classifier_id: Azure Content Understanding classifier to use
+            result: Optional dict filled with the process_document result once the run ends
+        """
+        if result is None:
+            result = {}
+        result.update({"success": False, "error": "Run did not complete"})
+        
+        thread = await self.project_client.agents.threads.create()
+        _log.debug("📝 Created thread: %s", thread.id)
+        
+        await self.project_client.agents.messages.create(
+            thread_id=thread.id,
+            role="user",
+            content=_PROCESS_PROMPT_TEMPLATE.format(
+                document_filename=document_filename,
+                classifier_id=classifier_id
+            )
+        )
+        
+        _log.info("🤖 Starting streamed agent run...")
+        run = None
+        async for event_type, event_data in self._stream(thread.id):
+            if isinstance(event_data, MessageDeltaChunk):
+                yield event_data.text
+            elif isinstance(event_data, ThreadRun):
+                run = event_data
+                if run.status == "requires_action":
+                    for tool_call in run.required_action.submit_tool_outputs.tool_calls:
+                        yield f"\n\n🔧 {tool_call.function.name}…\n\n"
+        
+        if run is None:
+            return
+        
+        _log.info("✅ Run completed with status: %s", run.status)
+        
+        if run.status == "failed":
+            _log.error("❌ Run failed: %s", run.last_error)
+            result["error"] = run.last_error
+            return
+        
+        result.clear()
+        result.update({
+            "success": True,
+            "thread_id": thread.id,
+            "responses": await self._collect_responses(thread.id, run.id)
+        })
+    
+    async def _stream(self, thread_id: str):
+        """Stream a run as (event_type, event_data) tuples under the same concurrency limits."""
+        async with self._sem:
+            await self._respect_rps()
+            async with await self.project_client.agents.runs.stream(
+                thread_id=thread_id,
+                agent_id=self.agent.id
+            ) as stream:
+                async for event_type, event_data, _ in stream:
+                    yield event_type, event_data
+    
+    async def _collect_responses(self, thread_id: str, run_id: str, return_all_responses: bool = True) -> list:
+        """Return the assistant responses on a thread, or only the newest one from the run."""
+        if not return_all_responses:
+            # Only the final summary is needed
+            return [await self._latest_response(thread_id, run_id)]
+        
+        # Get all messages from the thread
+        messages = self.project_client.agents.messages.list(thread_id=thread_id)
+        
+        # Extract the agent's responses
+        return [
+            content.text.value
+            async for msg in messages if msg.role == "assistant"
+            for content in msg.content if getattr(content, "text", None)
+        ]
+    
+    async def query(self, question: str, thread_id: str = None) -> str:
         """
         Ask a natural language question about processed documents.
         
@@ -187,58 +618,116 @@ Provide status updates for each step and the final results."""
             
         Returns:
             The agent's response
+            
+        Raises:
+            ResourceNotFoundError: If thread_id no longer exists; the caller should drop it,
+                                   since a new thread would not have the document context
         """
         # Create new thread if not provided
         if not thread_id:
-            thread = self.project_client.agents.threads.create()
+            thread = await self.project_client.agents.threads.create()
             thread_id = thread.id
         
         # Send the question
-        self.project_client.agents.messages.create(
+        await self.project_client.agents.messages.create(
             thread_id=thread_id,
             role="user",
             content=question
         )
         
         # Run the agent
-        run = self.project_client.agents.runs.create_and_process(
-            thread_id=thread_id,
-            agent_id=self.agent.id
-        )
+        run = await self._create_and_process(thread_id)
         
         if run.status == "failed":
             return f"Error: {run.last_error}"
         
-        # Get the latest assistant message
-        messages = self.project_client.agents.messages.list(thread_id=thread_id)
-        for msg in messages:
+        return await self._latest_response(thread_id, run.id)
+    
+    async def batch_query(self, questions: list[str], thread_id: Optional[str] = None) -> list[str]:
+        """
+        Ask several questions about the processed document in a single agent run.
+        
+        Args:
+            questions: The questions to ask, in order
+            thread_id: Optional thread ID to continue a conversation
+            
+        Returns:
+            One answer per question, or the whole reply as a single item if its
+            answer headers are not exactly 1..N in order
+        """
+        question_list = "\n".join(f"{i}. {q}" for i, q in enumerate(questions, 1))
+        reply = await self.query(
+            _BATCH_QUERY_PROMPT_TEMPLATE.format(count=len(questions), question_list=question_list),
+            thread_id
+        )
+        
+        # split() with a capture group yields [preamble, index, answer, index, answer, ...]
+        parts = _ANSWER_HEADER_RE.split(reply)
+        indices = [int(index) for index in parts[1::2]]
+        if indices != list(range(1, len(questions) + 1)):
+            _log.warning("⚠️ Expected answers 1-%s in order, got %s; returning the full reply", len(questions), indices)
+            return [reply]
+        return [answer.strip() for answer in parts[2::2]]
+    
+    async def thread_exists(self, thread_id: str) -> bool:
+        """Return True if the thread can still be used, e.g. one restored from a saved link."""
+        try:
+            await self.project_client.agents.threads.get(thread_id)
+            return True
+        except ResourceNotFoundError:
+            return False
+    
+    async def _latest_response(self, thread_id: str, run_id: str) -> str:
+        """Return the text of the newest assistant message produced by a run."""
+        # Newest first, one message per page, so a finished run needs a single request
+        messages = self.project_client.agents.messages.list(
+            thread_id=thread_id,
+            run_id=run_id,
+            order=ListSortOrder.DESCENDING,
+            limit=1
+        )
+        async for msg in messages:
             if msg.role == "assistant":
-                for content in msg.content:
-                    if hasattr(content, 'text') and content.text:
-                        return content.text.value
+                text = next((content.text.value for content in msg.content if getattr(content, "text", None)), None)
+                if text is not None:
+                    return text
         
         return "No response generated"
     
-    def delete_agent(self):
+    async def delete_agent(self):
         """Delete the agent permanently. Use with caution - normally not needed."""
         if self.agent:
-            self.project_client.agents.delete_agent(self.agent.id)
-            print(f"🗑️ Deleted agent: {self.agent.id}")
+            await self.project_client.agents.delete_agent(self.agent.id)
+            _log.info("🗑️ Deleted agent: %s", self.agent.id)
             self.agent = None
+    
+    async def close(self):
+        """Close the project client. The shared credential and connection pool stay open."""
+        await self.project_client.close()
+        self.result_cache.close()
 
 
-if __name__ == "__main__":
-    # Example usage
-    agent = ContentUnderstandingAgent()
-    
-    # Process a document
-    result = agent.process_document("claims_sample2.png")
+async def main():
+    configure_logging()
     
-    if result["success"]:
-        print("\n📊 Workflow Results:")
-        for response in result["responses"]:
-            print(response)
-            print("-" * 80)
+    # Example usage
+    agent = await ContentUnderstandingAgent.create()
     
-    # Note: Agent persists for reuse. Only delete if you want to remove it permanently.
-    # agent.delete_agent()
+    try:
+        # Process a document
+        result = await agent.process_document("claims_sample2.png")
+        
+        if result["success"]:
+            print("\n📊 Workflow Results:")
+            for response in result["responses"]:
+                print(response)
+                print("-" * 80)
+        
+        # Note: Agent persists for reuse. Only delete if you want to remove it permanently.
+        # await agent.delete_agent()
+    finally:
+        await agent.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
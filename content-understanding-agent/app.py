@@ -4,17 +4,42 @@ Upload documents, process them with AI, and query the extracted data.
 """
 import streamlit as st
 import os
-from pathlib import Path
-from dotenv import load_dotenv
-from azure.storage.blob import BlobServiceClient
-from azure.identity import DefaultAzureCredential
-from agent import ContentUnderstandingAgent
+import re
+import asyncio
+import functools
+import hashlib
+import threading
 import time
-from datetime import datetime
+from collections import deque
+from dotenv import load_dotenv
+
+# Error text that marks a model rate limit the agent's own retries could not get past
+_RATE_LIMIT_RE = re.compile(r'rate_limit_exceeded|RateLimitError')
 
 # Load environment variables
 load_dotenv()
 
+# The Azure SDKs and agent module are imported when the agent is first used (processing,
+# chat or a restored conversation), so a plain cold load renders without waiting on them
+
+# Stream agent output while processing; set AGENT_STREAMING=false to run in the background instead
+STREAM_PROCESSING = os.getenv("AGENT_STREAMING", "true").lower() == "true"
+PREFETCH_QUICK_QUESTIONS = os.getenv("AGENT_PREFETCH_QUESTIONS", "true").lower() == "true"
+
+# Seconds to wait for a server-side copy back from processed-docs before uploading instead
+COPY_BACK_TIMEOUT = 30
+
+# Chat history kept per session; older messages drop off (the agent thread keeps the full history)
+MAX_CHAT_MESSAGES = 50
+
+QUICK_QUESTIONS = (
+    "📊 What information did you extract?",
+    "👤 Who is the patient in this claim?",
+    "🏥 What medical services were provided?",
+    "💰 Show me the claim amount breakdown",
+    "✅ Validate the OCR results"
+)
+
 # Page configuration
 st.set_page_config(
     page_title="Content Understanding Agent",
@@ -24,7 +49,7 @@ st.set_page_config(
 )
 
 # Custom CSS for Microsoft Azure design
-st.markdown("""
+_APP_CSS = """
 <style>
     /* Import Segoe UI font (Microsoft's standard) */
     @import url('https://fonts.googleapis.com/css2?family=Segoe+UI:wght@400;600;700&display=swap');
@@ -231,20 +256,6 @@ st.markdown("""
     #MainMenu {visibility: hidden;}
     footer {visibility: hidden;}
     
-    /* Processing indicator - Azure style */
-    .processing-banner {
-        background: #fff4ce;
-        border: 1px solid #ffb900;
-        border-left: 4px solid #ffb900;
-        border-radius: 2px;
-        padding: 12px 16px;
-        margin-bottom: 1rem;
-        display: flex;
-        align-items: center;
-        gap: 12px;
-        font-size: 14px;
-        color: #323130;
-    }
     /* Processing indicator */
     .processing-banner {
         background: #fff7ed;
@@ -259,49 +270,210 @@ st.markdown("""
         color: #ea580c;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-# Initialize session state
-if 'agent' not in st.session_state:
-    st.session_state.agent = None
-if 'thread_id' not in st.session_state:
-    st.session_state.thread_id = None
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
-if 'processing' not in st.session_state:
-    st.session_state.processing = False
-if 'last_processed_file' not in st.session_state:
-    st.session_state.last_processed_file = None
-if 'documents_processed' not in st.session_state:
-    st.session_state.documents_processed = 0
-if 'agent_initialized' not in st.session_state:
-    st.session_state.agent_initialized = False
-if 'query_cache' not in st.session_state:
-    st.session_state.query_cache = {}  # Cache responses to avoid duplicate API calls
-if 'last_query_time' not in st.session_state:
-    st.session_state.last_query_time = 0  # Track last query timestamp for rate limiting
-if 'pending_question' not in st.session_state:
-    st.session_state.pending_question = None  # Track pending quick question to process
-
-
-def upload_to_blob(file_data, filename):
-    """Upload file to Azure Blob Storage incoming-docs container."""
+
+@st.cache_data
+def _css() -> str:
+    """Return the app CSS minified once, so each rerun sends the smallest possible style block."""
+    css = re.sub(r"/\*.*?\*/", "", _APP_CSS, flags=re.DOTALL)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};:,>])\s*", r"\1", css).strip()
+
+
+st.markdown(_css(), unsafe_allow_html=True)
+
+# Initialize session state; existing keys keep their values across reruns
+for key, default in (
+    ("thread_id", st.query_params.get("tid")),  # Resume the conversation from the URL
+    ("messages", deque(maxlen=MAX_CHAT_MESSAGES)),
+    ("last_processed_file", st.query_params.get("doc")),
+    ("thread_checked", False),  # Whether a thread restored from the URL was verified
+    ("documents_processed", 0),
+    ("last_query_time", 0),  # Track last query timestamp for rate limiting
+    ("processing_job", None),  # Background process_document run being polled
+    ("last_upload", None),  # (blob name, SHA-256) of the file currently in incoming-docs
+    ("initial_message_shown", False),  # Whether the greeting is already in messages
+    ("quick_prefetch", None),  # Background run answering QUICK_QUESTIONS for the current thread
+    ("agent_error", None),  # Why the last attempt to create the agent failed, if it did
+):
+    st.session_state.setdefault(key, default)
+
+
+@st.cache_resource
+def get_event_loop():
+    """Event loop shared by all sessions; the cached agent's async client is bound to it."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="agent-event-loop", daemon=True).start()
+    return loop
+
+
+def iter_async(async_gen):
+    """Iterate an async generator from the script thread, one item at a time on the shared loop."""
+    loop = get_event_loop()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(async_gen.__anext__(), loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        # Close it on the loop too, so an interrupted stream releases its run and
+        # concurrency slot there instead of being finalized off-loop by the GC
+        asyncio.run_coroutine_threadsafe(async_gen.aclose(), loop).result()
+
+
+def submit_async(coro):
+    """Schedule a coroutine on the shared event loop and return its concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def run_async(coro):
+    """Run a coroutine on the shared event loop and wait for its result."""
+    return submit_async(coro).result()
+
+
+@st.cache_resource(show_spinner=False)
+def get_agent_singleton(project_endpoint: str, agent_name: str):
+    """Create the agent once per process and reuse it across sessions and reruns."""
+    from agent import ContentUnderstandingAgent, configure_logging
+    
+    configure_logging()
+    return run_async(ContentUnderstandingAgent.create(agent_name))
+
+
+@st.cache_resource
+def get_credential():
+    """Create the async Azure credential once so its token cache persists across reruns."""
+    from azure.identity.aio import DefaultAzureCredential
+    
+    # Try DefaultAzureCredential first, skipping credential types that are never used here
+    return DefaultAzureCredential(
+        exclude_interactive_browser_credential=True,
+        exclude_visual_studio_code_credential=True,
+        exclude_shared_token_cache_credential=True,
+        exclude_powershell_credential=True
+    )
+
+
+@st.cache_resource
+def get_blob_service_client(storage_account_name: str):
+    """Create the async blob client once; it runs on the shared event loop and keeps its pool across reruns."""
+    from azure.storage.blob.aio import BlobServiceClient
+    
+    return BlobServiceClient(
+        account_url=f"https://{storage_account_name}.blob.core.windows.net",
+        credential=get_credential(),
+        # Anything over 4 MB is sent as 4 MB blocks uploaded in parallel
+        max_single_put_size=4 * 1024 * 1024,
+        max_block_size=4 * 1024 * 1024,
+        # Fail fast on an unreachable endpoint, but give each block time to go up
+        connection_timeout=10,
+        read_timeout=120
+    )
+
+
+@st.cache_resource
+def get_container_client(storage_account_name: str, container_name: str = "incoming-docs"):
+    """Return the cached container client for uploads."""
+    return get_blob_service_client(storage_account_name).get_container_client(container_name)
+
+
+@functools.lru_cache(maxsize=1)
+def _storage_account() -> str:
+    """Storage account name; read from the environment once per process."""
+    return os.getenv("STORAGE_ACCOUNT_NAME", "demostorageak")
+
+
+def get_incoming_container():
+    """Return the incoming-docs container client for the configured storage account."""
+    return get_container_client(_storage_account())
+
+
+def get_processed_container():
+    """Return the processed-docs container client, where clean_up archives finished documents."""
+    return get_container_client(_storage_account(), "processed-docs")
+
+
+def upload_to_blob(uploaded_file, filename, content_md5: bytes = None):
+    """Upload a file to incoming-docs from the script thread; see upload_to_blob_async."""
+    return run_async(upload_to_blob_async(
+        get_incoming_container(), uploaded_file, filename, content_md5, get_processed_container()
+    ))
+
+
+async def _blob_md5(blob_client):
+    """Return a blob's stored Content-MD5, or None if the blob or its MD5 is missing."""
+    from azure.core.exceptions import ResourceNotFoundError
+    
+    try:
+        existing_md5 = (await blob_client.get_blob_properties()).content_settings.content_md5
+    except ResourceNotFoundError:
+        return None
+    return bytes(existing_md5) if existing_md5 else None
+
+
+async def _copy_from_processed(blob_client, processed_blob, content_md5: bytes) -> bool:
+    """
+    Copy identical content back from processed-docs server-side.
+    
+    Returns False if there is nothing to copy, the copy fails, or it is still pending
+    after COPY_BACK_TIMEOUT seconds, so the caller can fall back to a normal upload.
+    """
+    try:
+        if await _blob_md5(processed_blob) != content_md5:
+            return False
+        copy = await blob_client.start_copy_from_url(processed_blob.url)
+        copy_status = copy["copy_status"]
+        deadline = time.monotonic() + COPY_BACK_TIMEOUT
+        while copy_status == "pending" and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+            copy_status = (await blob_client.get_blob_properties()).copy.status
+        if copy_status == "pending":
+            # Don't leave a half-copied blob for the upload below to race with
+            await blob_client.abort_copy(copy["copy_id"])
+        return copy_status == "success"
+    except Exception:
+        return False
+
+
+async def upload_to_blob_async(container_client, uploaded_file, filename, content_md5: bytes = None,
+                               processed_container=None):
+    """
+    Upload a file-like object to Azure Blob Storage incoming-docs container in parallel blocks.
+    
+    When content_md5 is given it is stored on the blob, and the upload is skipped if a
+    blob with the same name and MD5 is already there. If processed_container already
+    holds the same content (the document was processed before), it is copied back
+    server-side instead; if that copy fails, the file is uploaded as usual.
+    """
+    from azure.storage.blob import ContentSettings
+    
     try:
-        storage_account_name = os.getenv("STORAGE_ACCOUNT_NAME", "demostorageak")
-        account_url = f"https://{storage_account_name}.blob.core.windows.net"
-        
-        # Try DefaultAzureCredential first
-        credential = DefaultAzureCredential()
-        blob_service_client = BlobServiceClient(
-            account_url=account_url,
-            credential=credential
-        )
-        
-        container_client = blob_service_client.get_container_client("incoming-docs")
         blob_client = container_client.get_blob_client(filename)
         
-        # Upload file
-        blob_client.upload_blob(file_data, overwrite=True)
+        if content_md5 is not None:
+            # Skip the upload if identical content is already in incoming-docs
+            if await _blob_md5(blob_client) == content_md5:
+                return True, f"✅ {filename} is already in incoming-docs"
+            
+            # Same-account copy from processed-docs; no file bytes leave this machine
+            if processed_container is not None and await _copy_from_processed(
+                blob_client, processed_container.get_blob_client(filename), content_md5
+            ):
+                return True, f"♻️ Copied {filename} back from processed-docs"
+        
+        # Stream the file so large documents go up as parallel block PUTs
+        uploaded_file.seek(0)
+        await blob_client.upload_blob(
+            uploaded_file,
+            overwrite=True,
+            blob_type="BlockBlob",
+            length=uploaded_file.size,
+            max_concurrency=8,
+            validate_content=False,  # Whole-file MD5 is already sent in content_settings
+            content_settings=ContentSettings(content_md5=content_md5) if content_md5 else None
+        )
         return True, f"✅ Uploaded {filename} to incoming-docs"
     except Exception as e:
         error_msg = str(e)
@@ -310,63 +482,175 @@ def upload_to_blob(file_data, filename):
         return False, f"❌ Upload failed: {error_msg}"
 
 
-def initialize_agent():
-    """Initialize the Content Understanding Agent."""
-    if st.session_state.agent is None:
-        try:
-            st.session_state.agent = ContentUnderstandingAgent()
-            st.session_state.agent_initialized = True
-            return True, "✅ Agent initialized successfully"
-        except Exception as e:
-            return False, f"❌ Failed to initialize agent: {str(e)}"
-    return True, "Agent already initialized"
+async def upload_and_process(agent, container_client, uploaded_file, filename, content_md5: bytes = None,
+                             processed_container=None):
+    """Upload then process a document in one background job, so the script thread never waits on either."""
+    success, message = await upload_to_blob_async(
+        container_client, uploaded_file, filename, content_md5, processed_container
+    )
+    if not success:
+        return {"success": False, "error": message}
+    return await agent.process_document(filename)
+
 
+def get_agent():
+    """Return the process-wide Content Understanding Agent, creating it on first use."""
+    return get_agent_singleton(os.getenv("PROJECT_ENDPOINT"), "content-understanding-agent")
 
-def query_with_cache(question: str, thread_id: str, max_retries: int = 3):
-    """Query agent with caching and retry logic to handle rate limits."""
-    import time
-    import re
+
+def try_get_agent():
+    """
+    Return the shared agent, or None if it could not be created.
     
-    # Create cache key from question and thread
-    cache_key = f"{thread_id}:{question.lower().strip()}"
+    The failure is kept in session state for the status badge and error messages; a
+    failed creation is not cached, so the next use tries again.
+    """
+    try:
+        agent = get_agent()
+    except Exception as e:
+        st.session_state.agent_error = f"❌ Failed to initialize agent: {str(e)}"
+        return None
+    st.session_state.agent_error = None
+    return agent
+
+
+@st.cache_resource(show_spinner=False)
+def start_warm_up():
+    """Wake the Function App host once per process, so the first Process click does not pay the cold start."""
+    import function_tools
     
-    # Check cache first
-    if cache_key in st.session_state.query_cache:
-        return st.session_state.query_cache[cache_key]
+    threading.Thread(target=function_tools.warm_up, daemon=True).start()
+
+
+def normalize_question(question: str) -> str:
+    """Reduce a question to lowercase words so trivially different phrasings share a cache entry."""
+    words = re.sub(r"[^\w\s]", " ", question.lower()).split()
+    return " ".join(words)
+
+
+@st.cache_data(ttl=3600, max_entries=1024, show_spinner=False)
+def _cached_query(query_key: str, _thread_id: str, _question: str) -> str:
+    """
+    Answer a question once per thread, shared across reruns and sessions (LRU with a 1 hour TTL).
+    
+    Only query_key is hashed by Streamlit; the underscored arguments are passed through.
+    """
+    response = run_async(get_agent().query(_question, _thread_id))
+    
+    # Raising keeps failed runs out of the cache
+    if response.startswith("Error:"):
+        raise RuntimeError(response)
+    return response
+
+
+def clean_question(question: str) -> str:
+    """Strip the leading emoji from a quick question before sending it to the agent."""
+    return question.split(" ", 1)[1] if " " in question else question
+
+
+def start_quick_prefetch(thread_id: str):
+    """Answer all quick questions in one background run so later clicks need no agent call."""
+    st.session_state.quick_prefetch = {
+        "thread_id": thread_id,
+        "future": submit_async(get_agent().batch_query(
+            [clean_question(q) for q in QUICK_QUESTIONS], thread_id
+        ))
+    }
+
+
+def prefetched_answers(thread_id: str):
+    """
+    Wait for the quick-question prefetch on this thread and return its answers.
+    
+    Returns None when there is no prefetch or it could not be split into one answer per question.
+    """
+    prefetch = st.session_state.quick_prefetch
+    if prefetch is None or prefetch["thread_id"] != thread_id:
+        return None
+    try:
+        answers = prefetch["future"].result()
+    except Exception:
+        return None
+    return answers if len(answers) == len(QUICK_QUESTIONS) else None
+
+
+def query_with_cache(question: str, thread_id: str):
+    """Query agent with caching; rate limits are retried by the agent, so only the final outcome is handled here."""
+    # Fixed-size key for the thread and normalized question, however long the question is
+    query_key = hashlib.blake2b(
+        f"{thread_id}|{normalize_question(question)}".encode(), digest_size=16
+    ).hexdigest()
     
-    # Make actual API call with retry logic
-    for attempt in range(max_retries):
-        try:
-            response = st.session_state.agent.query(question, thread_id)
-            
-            # Store in cache on success
-            st.session_state.query_cache[cache_key] = response
-            return response
-            
-        except Exception as e:
-            error_str = str(e)
-            
-            # Check if it's a rate limit error
-            if 'rate_limit_exceeded' in error_str or 'RateLimitError' in error_str:
-                # Try to extract wait time from error message
-                wait_match = re.search(r'retry after (\d+) seconds', error_str)
-                wait_time = int(wait_match.group(1)) if wait_match else (2 ** attempt) * 5
-                
-                if attempt < max_retries - 1:
-                    st.warning(f"⏳ Rate limit hit. Waiting {wait_time} seconds before retry {attempt + 1}/{max_retries}...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    return f"❌ **Rate Limit Exceeded**\n\nThe AI model is receiving too many requests. Please:\n- Wait 30-60 seconds before asking another question\n- Request quota increase at: https://aka.ms/oai/quotaincrease\n\nTechnical details: {error_str}"
-            else:
-                # Non-rate-limit error, raise it
-                raise
+    # A thread runs one agent run at a time, so let any prefetch finish first
+    prefetched_answers(thread_id)
     
-    return "❌ Failed to get response after multiple retries."
+    # Make actual API call; cache hits return immediately
+    try:
+        return _cached_query(query_key, thread_id, question)
+    except Exception as e:
+        error_str = str(e)
+        if not _RATE_LIMIT_RE.search(error_str):
+            # Non-rate-limit error, raise it
+            raise
+        return f"❌ **Rate Limit Exceeded**\n\nThe AI model is receiving too many requests. Please:\n- Wait 30-60 seconds before asking another question\n- Request quota increase at: https://aka.ms/oai/quotaincrease\n\nTechnical details: {error_str}"
+
+
+def show_process_result(result, filename):
+    """Record a finished process_document result in session state and display it."""
+    if result["success"]:
+        # The workflow's clean_up step moved the blob out of incoming-docs
+        st.session_state.last_upload = None
+        st.session_state.thread_id = result["thread_id"]
+        st.session_state.last_processed_file = filename
+        st.session_state.thread_checked = True
+        
+        # Warm the quick-question answers while the user reads the results
+        if PREFETCH_QUICK_QUESTIONS:
+            start_quick_prefetch(result["thread_id"])
+        
+        # Keep the conversation in the URL so a refresh or shared link resumes it
+        st.query_params["tid"] = result["thread_id"]
+        st.query_params["doc"] = filename
+        st.session_state.documents_processed += 1
+        
+        # Display results
+        st.success("✅ Document processed successfully!")
+        
+        # Add initial message to chat
+        initial_msg = "Hello! I've successfully processed your document. I extracted OCR data, parsed the content, and created an Excel summary. What would you like to know?"
+        if not st.session_state.initial_message_shown:
+            st.session_state.messages.append({"role": "assistant", "content": initial_msg})
+            st.session_state.initial_message_shown = True
+        
+        with st.expander("📊 View Processing Details"):
+            for i, response in enumerate(result["responses"], 1):
+                st.markdown(f"**Step {i}:**")
+                st.info(response)
+    else:
+        st.error(f"❌ Processing failed: {result.get('error', 'Unknown error')}")
+
+
+@st.cache_data(show_spinner=False)
+def _file_card_html(name: str, size_mb: float) -> str:
+    """Build the uploaded-file info card once per file name and size."""
+    return f"""
+        <div style="background: white; border: 1px solid #e2e8f0; border-radius: 12px; padding: 16px; margin-bottom: 20px; display: flex; align-items: center; gap: 12px;">
+            <div style="width: 40px; height: 40px; background: #dbeafe; border-radius: 8px; display: flex; align-items: center; justify-content: center; font-size: 20px;">
+                📋
+            </div>
+            <div style="flex: 1;">
+                <div style="font-weight: 600; color: #1e293b; margin-bottom: 4px;">{name}</div>
+                <div style="font-size: 12px; color: #64748b;">{size_mb:.2f} MB • Just uploaded</div>
+            </div>
+        </div>
+        """
 
 
+# The agent itself is created on first use; only the Function App is woken up front
+start_warm_up()
+
 # Custom header with status badge
-agent_status = "Agent Active" if st.session_state.agent_initialized else "Agent Inactive"
+agent_status = "Agent Inactive" if st.session_state.agent_error else "Agent Active"
 st.markdown(f"""
 <div class="main-header">
     <h1 class="header-title">
@@ -380,11 +664,18 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
-# Auto-initialize agent on first load
-if not st.session_state.agent_initialized:
-    success, message = initialize_agent()
-    if success:
-        st.rerun()
+# Check a thread restored from the URL once per session
+if st.session_state.thread_id and not st.session_state.thread_checked and (agent := try_get_agent()):
+    st.session_state.thread_checked = True
+    try:
+        thread_exists = run_async(agent.thread_exists(st.session_state.thread_id))
+    except Exception:
+        # Network or auth trouble is not proof the thread is gone; keep it unverified
+        thread_exists = True
+    if not thread_exists:
+        st.session_state.thread_id = None
+        st.session_state.last_processed_file = None
+        st.query_params.clear()
 
 # Main content area - 2 columns
 col1, col2 = st.columns([1, 1.5], gap="large")
@@ -401,78 +692,113 @@ with col1:
     
     if uploaded_file:
         # File info card
-        file_size_mb = len(uploaded_file.getvalue()) / (1024 * 1024)
-        st.markdown(f"""
-        <div style="background: white; border: 1px solid #e2e8f0; border-radius: 12px; padding: 16px; margin-bottom: 20px; display: flex; align-items: center; gap: 12px;">
-            <div style="width: 40px; height: 40px; background: #dbeafe; border-radius: 8px; display: flex; align-items: center; justify-content: center; font-size: 20px;">
-                📋
-            </div>
-            <div style="flex: 1;">
-                <div style="font-weight: 600; color: #1e293b; margin-bottom: 4px;">{uploaded_file.name}</div>
-                <div style="font-size: 12px; color: #64748b;">{file_size_mb:.2f} MB • Just uploaded</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(_file_card_html(uploaded_file.name, uploaded_file.size / (1024 * 1024)), unsafe_allow_html=True)
         
         # Process button
-        if st.button("⚡ Process Document", type="primary", use_container_width=True):
-            # Initialize agent if needed
-            if st.session_state.agent is None:
-                success, message = initialize_agent()
-                if not success:
-                    st.error(message)
-                    st.stop()
+        if st.button("⚡ Process Document", type="primary", use_container_width=True,
+                     disabled=st.session_state.processing_job is not None):
+            agent = try_get_agent()
+            if agent is None:
+                st.error(st.session_state.agent_error)
+                st.stop()
             
-            # Upload file first
-            with st.spinner("Uploading file..."):
-                success, message = upload_to_blob(uploaded_file.getvalue(), uploaded_file.name)
-                st.info(message)  # Show upload status
-                if not success:
-                    st.error(message)
-                    st.stop()
+            # Hash the upload buffer in place (getvalue() would copy the whole file)
+            with uploaded_file.getbuffer() as file_bytes:
+                file_sha = hashlib.sha256(file_bytes).hexdigest()
+                content_md5 = hashlib.md5(file_bytes).digest()
+                cache_key = agent.cache_key(file_bytes)
             
-            # Process with agent
-            if st.session_state.processing:
-                st.markdown('<div class="processing-banner">⚡ Processing document: OCR extraction in progress...</div>', unsafe_allow_html=True)
+            # Look up results from an earlier run on the same document
+            cached_result = agent.get_cached_result(cache_key)
             
-            st.session_state.processing = True
-            with st.spinner("🤖 Processing document... This may take a minute..."):
+            if cached_result is not None:
+                st.info("♻️ Using cached results for this document")
+                # The cache is shared across sessions, so this session gets its own thread
                 try:
-                    result = st.session_state.agent.process_document(uploaded_file.name)
-                    
-                    if result["success"]:
-                        st.session_state.thread_id = result["thread_id"]
-                        st.session_state.last_processed_file = uploaded_file.name
-                        st.session_state.documents_processed += 1
-                        
-                        # Display results
-                        st.success("✅ Document processed successfully!")
+                    thread_id = run_async(agent.start_thread_from_result(cached_result))
+                    show_process_result(dict(cached_result, thread_id=thread_id), uploaded_file.name)
+                except Exception as e:
+                    st.error(f"❌ Error: {str(e)}")
+            else:
+                # The blob is named after the file, so a rename must upload again even for the same bytes
+                upload_key = (uploaded_file.name, file_sha)
+                needs_upload = st.session_state.last_upload != upload_key
+                
+                if STREAM_PROCESSING:
+                    # Upload and processing share one status container that updates in place
+                    result = {}
+                    with st.status("Processing document...", expanded=True) as status:
+                        # Upload file first, unless this exact content was just uploaded
+                        if needs_upload:
+                            status.update(label="Uploading...")
+                            success, message = upload_to_blob(uploaded_file, uploaded_file.name, content_md5)
+                            st.write(message)  # Show upload status
+                            if not success:
+                                status.update(label="Upload failed", state="error")
+                                st.stop()
+                            st.session_state.last_upload = upload_key
                         
-                        # Add initial message to chat
-                        initial_msg = "Hello! I've successfully processed your document. I extracted OCR data, parsed the content, and created an Excel summary. What would you like to know?"
-                        if not any(msg["content"] == initial_msg for msg in st.session_state.messages):
-                            st.session_state.messages.append({"role": "assistant", "content": initial_msg})
+                        # Show the agent's progress and tool calls as they happen
+                        status.update(label="Running OCR + extraction...")
+                        try:
+                            st.write_stream(iter_async(
+                                agent.stream_document(uploaded_file.name, result=result)
+                            ))
+                        except Exception as e:
+                            result = {"success": False, "error": str(e)}
                         
-                        with st.expander("📊 View Processing Details"):
-                            for i, response in enumerate(result["responses"], 1):
-                                st.markdown(f"**Step {i}:**")
-                                st.info(response)
+                        if result.get("success"):
+                            status.update(label="Document processed", state="complete", expanded=False)
+                        else:
+                            status.update(label="Processing failed", state="error")
+                    
+                    # Results go outside the status block, which cannot hold the details expander
+                    agent.cache_result(cache_key, result)
+                    show_process_result(result, uploaded_file.name)
+                else:
+                    # Upload and process with agent in the background so the app stays responsive
+                    if needs_upload:
+                        job = upload_and_process(
+                            agent, get_incoming_container(),
+                            uploaded_file, uploaded_file.name, content_md5, get_processed_container()
+                        )
                     else:
-                        st.error(f"❌ Processing failed: {result.get('error', 'Unknown error')}")
-                except Exception as e:
-                    st.error(f"❌ Error: {str(e)}")
-                finally:
-                    st.session_state.processing = False
+                        job = agent.process_document(uploaded_file.name)
+                    st.session_state.processing_job = {
+                        "future": submit_async(job),
+                        "filename": uploaded_file.name,
+                        "cache_key": cache_key,
+                        "started": time.time()
+                    }
+                    st.rerun()
         
         # Clear button
         if st.button("🗑️ Clear & Upload New", use_container_width=True):
             st.session_state.last_processed_file = None
-            st.session_state.messages = []
+            st.session_state.messages.clear()
+            st.session_state.initial_message_shown = False
+            st.session_state.quick_prefetch = None
+            st.query_params.clear()
             st.rerun()
     
     else:
         st.info("👆 Upload a document to get started")
     
+    # Background processing status
+    job = st.session_state.processing_job
+    if job is not None:
+        if job["future"].done():
+            st.session_state.processing_job = None
+            try:
+                result = job["future"].result()
+                get_agent().cache_result(job["cache_key"], result)
+                show_process_result(result, job["filename"])
+            except Exception as e:
+                st.error(f"❌ Error: {str(e)}")
+        else:
+            elapsed = time.time() - job["started"]
+            st.info(f"🤖 Processing {job['filename']}... {elapsed:.0f}s elapsed. This may take a minute...")
+    
     # Stats dashboard
     st.markdown("---")
     stat_col1, stat_col2 = st.columns(2)
@@ -488,16 +814,81 @@ with col1:
     with stat_col2:
         st.markdown("""
         <div class="stat-card">
-            <div class="stat-value">7</div>
+            <div class="stat-value">10</div>
             <div class="stat-label">Functions Available</div>
         </div>
         """, unsafe_allow_html=True)
 
-with col2:
+
+def _error_message(error: Exception) -> str:
+    """Chat text for a failed question; a deleted thread is forgotten so the user processes the document again."""
+    from azure.core.exceptions import ResourceNotFoundError
+    
+    if isinstance(error, ResourceNotFoundError):
+        st.session_state.thread_id = None
+        st.session_state.last_processed_file = None
+        st.query_params.pop("tid", None)
+        st.query_params.pop("doc", None)
+        message = "⚠️ This conversation has expired. Please process the document again to keep asking questions."
+        # The chat is hidden once there is no active document, so show the reason as a toast too
+        st.toast(message)
+        return message
+    return f"❌ Error: {str(error)}"
+
+
+def _ask_quick(question: str):
+    """Button callback: add a quick question and its answer to the chat."""
+    st.session_state.messages.append({"role": "user", "content": question})
+    if not st.session_state.thread_id:
+        return
+    
+    try:
+        st.session_state.last_query_time = time.time()
+        with st.spinner("🤖 Thinking..."):
+            answers = prefetched_answers(st.session_state.thread_id)
+            if answers:
+                response = answers[QUICK_QUESTIONS.index(question)]
+            else:
+                # Extract clean question without emoji for API call
+                response = query_with_cache(clean_question(question), st.session_state.thread_id)
+        st.session_state.messages.append({"role": "assistant", "content": response})
+    except Exception as e:
+        st.session_state.messages.append({"role": "assistant", "content": _error_message(e)})
+
+
+def _ask_all():
+    """Button callback: ask every quick question in one run, one assistant message per answer."""
+    st.session_state.messages.append({
+        "role": "user",
+        "content": "\n".join(f"- {q}" for q in QUICK_QUESTIONS)
+    })
+    if not st.session_state.thread_id:
+        return
+    
+    try:
+        st.session_state.last_query_time = time.time()
+        with st.spinner("🤖 Answering all questions..."):
+            answers = prefetched_answers(st.session_state.thread_id) or run_async(
+                get_agent().batch_query(
+                    [clean_question(q) for q in QUICK_QUESTIONS], st.session_state.thread_id
+                )
+            )
+        if len(answers) == len(QUICK_QUESTIONS):
+            for question, answer in zip(QUICK_QUESTIONS, answers):
+                st.session_state.messages.append({"role": "assistant", "content": f"**{question}**\n\n{answer}"})
+        else:
+            st.session_state.messages.append({"role": "assistant", "content": answers[0]})
+    except Exception as e:
+        st.session_state.messages.append({"role": "assistant", "content": _error_message(e)})
+
+
+@st.fragment
+def _chat_panel():
+    """Chat column; its widgets rerun only this fragment, not the upload column, stats or CSS."""
     st.markdown('<div class="section-title">💬 Chat with Agent</div>', unsafe_allow_html=True)
     
     # Processing indicator
-    if st.session_state.processing:
+    if st.session_state.processing_job is not None:
         st.markdown('<div class="processing-banner">⚡ Processing document: OCR extraction in progress...</div>', unsafe_allow_html=True)
     
     # Chat interface
@@ -515,39 +906,14 @@ with col2:
         st.markdown("---")
         st.markdown("**⚡ Quick Questions:**")
         
-        quick_questions = [
-            "📊 What information did you extract?",
-            "👤 Who is the patient in this claim?",
-            "🏥 What medical services were provided?",
-            "💰 Show me the claim amount breakdown",
-            "✅ Validate the OCR results"
-        ]
-        
-        # Display quick buttons in a compact grid
-        for question in quick_questions:
-            if st.button(question, key=f"quick_{question}", use_container_width=True):
-                # Add user message and trigger immediate rerun to show it
-                st.session_state.messages.append({"role": "user", "content": question})
-                # Mark that we need to process this question
-                st.session_state.pending_question = question
-                st.rerun()
+        # Display quick buttons in a compact grid; callbacks answer before the fragment reruns
+        for i, question in enumerate(QUICK_QUESTIONS):
+            st.button(question, key=f"qa_{i}", use_container_width=True,
+                      on_click=_ask_quick, args=(question,))
         
-        # Process pending question after UI has updated
-        if hasattr(st.session_state, 'pending_question') and st.session_state.pending_question:
-            question_to_process = st.session_state.pending_question
-            st.session_state.pending_question = None  # Clear the pending state
-            
-            if st.session_state.agent and st.session_state.thread_id:
-                try:
-                    # Extract clean question without emoji for API call
-                    clean_question = question_to_process.split(" ", 1)[1] if " " in question_to_process else question_to_process
-                    st.session_state.last_query_time = time.time()
-                    response = query_with_cache(clean_question, st.session_state.thread_id)
-                    st.session_state.messages.append({"role": "assistant", "content": response})
-                    st.rerun()
-                except Exception as e:
-                    st.session_state.messages.append({"role": "assistant", "content": f"❌ Error: {str(e)}"})
-                    st.rerun()
+        # All quick questions in one message and one agent run
+        st.button("⚡ Ask all common questions", key="quick_all", type="primary",
+                  use_container_width=True, on_click=_ask_all)
         
         st.markdown("---")
         
@@ -557,16 +923,15 @@ with col2:
             st.session_state.messages.append({"role": "user", "content": prompt})
             
             # Get agent response
-            if st.session_state.agent and st.session_state.thread_id:
+            if st.session_state.thread_id and try_get_agent():
                 try:
                     st.session_state.last_query_time = time.time()  # Update query timestamp
                     response = query_with_cache(prompt, st.session_state.thread_id)
                     st.session_state.messages.append({"role": "assistant", "content": response})
-                    st.rerun()
+                    st.rerun(scope="fragment")
                 except Exception as e:
-                    error_msg = f"❌ Error: {str(e)}"
-                    st.session_state.messages.append({"role": "assistant", "content": error_msg})
-                    st.rerun()
+                    st.session_state.messages.append({"role": "assistant", "content": _error_message(e)})
+                    st.rerun(scope="fragment")
             else:
                 st.error("❌ Agent not initialized or no active thread")
     
@@ -591,3 +956,12 @@ with col2:
         - "Validate the OCR quality"
         - Any other natural language question about the content!
         """)
+
+
+with col2:
+    _chat_panel()
+
+# Poll the background processing job until it finishes
+if st.session_state.processing_job is not None:
+    time.sleep(0.5)
+    st.rerun()
@@ -1,13 +1,70 @@
 """
 Function tools that wrap Azure Functions for use by the agent.
-These functions are registered as tools that the AI agent can call.
+
+This is the supported synchronous API for scripts and other non-async callers.
+The agent itself registers the async versions in tools_async.py, which reuse these
+docstrings as their tool descriptions and the endpoint constants below, so changes
+to a tool's behavior or description belong in both modules.
 """
 import os
 import requests
-import json
-from typing import Dict, Any
-from azure.storage.blob import BlobServiceClient
-from azure.identity import DefaultAzureCredential
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+# The endpoints below are resolved once at import, so make sure .env has been loaded first
+load_dotenv()
+
+FUNCTION_APP_URL = os.getenv("FUNCTION_APP_URL", "https://func-content-understanding-2220.azurewebsites.net/api")
+STORAGE_ACCOUNT_NAME = os.getenv("STORAGE_ACCOUNT_NAME", "demostorageak")
+INCOMING_DOCS_URL = f"https://{STORAGE_ACCOUNT_NAME}.blob.core.windows.net/incoming-docs"
+
+WARMUP_URL = f"{FUNCTION_APP_URL}/warmup"
+PERFORM_OCR_URL = f"{FUNCTION_APP_URL}/perform_ocr"
+PROCESS_DOCUMENT_FULL_URL = f"{FUNCTION_APP_URL}/process_document_full"
+PARSE_OCR_URL = f"{FUNCTION_APP_URL}/parse_ocr"
+CREATE_EXCEL_URL = f"{FUNCTION_APP_URL}/create_excel"
+CLEAN_UP_URL = f"{FUNCTION_APP_URL}/clean_up"
+
+# Concurrent perform_ocr calls issued by perform_ocr_parallel
+OCR_MAX_WORKERS = 8
+
+# Shared keep-alive connection pool for all Azure Function calls, retrying throttled
+# and transient failures with backoff; after the last retry the response is returned as-is.
+# 500 is not retried: the Function App returns it for every failure (bad analyzer, missing
+# blob, failed OCR), and retrying would re-run long, billable OCR for the same error.
+# For the same reason read=0: a read timeout means the function is still running, so only
+# failed connections and the statuses below are retried
+_SESSION = requests.Session()
+_SESSION.headers.update({"Content-Type": "application/json"})
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=3,
+        read=0,
+        backoff_factor=0.5,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=["POST"],
+        raise_on_status=False
+    )
+))
+
+
+def warm_up() -> bool:
+    """
+    Sends a tiny request to the Function App's warmup endpoint so the host is already
+    running when the first document is processed. Not an agent tool.
+    
+    Returns:
+        True if the Function App answered, False otherwise
+    """
+    try:
+        return _SESSION.get(WARMUP_URL, timeout=5).ok
+    except requests.exceptions.RequestException:
+        return False
 
 
 def perform_ocr(blob_name: str, classifier_id: str = "prebuilt-layout") -> Dict[str, Any]:
@@ -25,28 +82,74 @@ def perform_ocr(blob_name: str, classifier_id: str = "prebuilt-layout") -> Dict[
         - container_name: Container where results are stored (enhanced-results)
         - error: Error message if failed
     """
-    function_url = os.getenv("FUNCTION_APP_URL", "https://func-content-understanding-2220.azurewebsites.net/api")
-    storage_account_name = os.getenv("STORAGE_ACCOUNT_NAME", "demostorageak")
+    payload = {
+        "analyzer_id": classifier_id,  # Azure Function expects 'analyzer_id'
+        "blob_url": f"{INCOMING_DOCS_URL}/{blob_name}",
+        "storage_account_name": STORAGE_ACCOUNT_NAME
+    }
     
-    # Construct the blob URL
-    blob_url = f"https://{storage_account_name}.blob.core.windows.net/incoming-docs/{blob_name}"
+    try:
+        response = _SESSION.post(
+            PERFORM_OCR_URL,
+            json=payload,
+            timeout=300  # 5 minutes for OCR processing
+        )
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.HTTPError:
+        # Get detailed error from response body
+        try:
+            error_detail = response.json()
+            return {
+                "success": False,
+                "error": f"HTTP {response.status_code}: {error_detail}"
+            }
+        except:
+            return {
+                "success": False,
+                "error": f"HTTP {response.status_code}: {response.text[:500]}"
+            }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"{type(e).__name__}: {str(e)}"
+        }
+
+
+def process_document_full(blob_name: str, classifier_id: str = "prebuilt-layout") -> Dict[str, Any]:
+    """
+    Runs OCR, the text summary and the Excel report for a document in a single call.
+    
+    This is the preferred way to process a document; perform_ocr, parse_ocr and
+    create_excel are only needed to retry a step that failed.
     
+    Args:
+        blob_name: Name of the blob/file in the incoming-docs container (e.g., "claims_sample3.jpg")
+        classifier_id: The classifier/analyzer ID to use (default: "prebuilt-layout")
+        
+    Returns:
+        Dictionary containing:
+        - success: Boolean indicating if every step was successful
+        - ocr_result_blob_name: Name of the JSON file created with OCR results (enhanced-results)
+        - summary_report_blob_name: Name of the summary text file created (summary-reports)
+        - excel_blob_name: Name of the Excel file created (excel-result)
+        - error: Error message if failed
+    """
     payload = {
         "analyzer_id": classifier_id,  # Azure Function expects 'analyzer_id'
-        "blob_url": blob_url,
-        "storage_account_name": storage_account_name
+        "blob_url": f"{INCOMING_DOCS_URL}/{blob_name}",
+        "storage_account_name": STORAGE_ACCOUNT_NAME
     }
     
     try:
-        response = requests.post(
-            f"{function_url}/perform_ocr",
+        response = _SESSION.post(
+            PROCESS_DOCUMENT_FULL_URL,
             json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=300  # 5 minutes for OCR processing
+            timeout=360  # OCR plus both reports
         )
         response.raise_for_status()
         return response.json()
-    except requests.exceptions.HTTPError as e:
+    except requests.exceptions.HTTPError:
         # Get detailed error from response body
         try:
             error_detail = response.json()
@@ -66,6 +169,29 @@ def perform_ocr(blob_name: str, classifier_id: str = "prebuilt-layout") -> Dict[
         }
 
 
+def perform_ocr_parallel(blob_names: List[str], classifier_id: str = "prebuilt-layout") -> Dict[str, Any]:
+    """
+    Performs OCR on several documents concurrently using Azure Content Understanding.
+    
+    Args:
+        blob_names: Names of the blobs/files in the incoming-docs container
+                    (e.g., ["claims_sample2.png", "claims_sample3.jpg"])
+        classifier_id: The classifier/analyzer ID to use (default: "prebuilt-layout")
+        
+    Returns:
+        Dictionary containing:
+        - success: Boolean indicating if OCR was successful for every document
+        - results: List of perform_ocr results, in the same order as blob_names
+    """
+    with ThreadPoolExecutor(max_workers=OCR_MAX_WORKERS) as executor:
+        results = list(executor.map(lambda blob_name: perform_ocr(blob_name, classifier_id), blob_names))
+    
+    return {
+        "success": all(result.get("success") for result in results),
+        "results": results
+    }
+
+
 def parse_ocr(ocr_result_blob_name: str) -> Dict[str, Any]:
     """
     Creates a text summary from OCR results.
@@ -81,19 +207,15 @@ def parse_ocr(ocr_result_blob_name: str) -> Dict[str, Any]:
         - summary_container_name: Container where summary is stored (summary-reports)
         - error: Error message if failed
     """
-    function_url = os.getenv("FUNCTION_APP_URL", "https://func-content-understanding-2220.azurewebsites.net/api")
-    storage_account_name = os.getenv("STORAGE_ACCOUNT_NAME", "demostorageak")
-    
     payload = {
         "ocr_result_blob_name": ocr_result_blob_name,
-        "storage_account_name": storage_account_name
+        "storage_account_name": STORAGE_ACCOUNT_NAME
     }
     
     try:
-        response = requests.post(
-            f"{function_url}/parse_ocr",
+        response = _SESSION.post(
+            PARSE_OCR_URL,
             json=payload,
-            headers={"Content-Type": "application/json"},
             timeout=60
         )
         response.raise_for_status()
@@ -120,19 +242,15 @@ def create_excel(ocr_result_blob_name: str) -> Dict[str, Any]:
         - container_name: Container where Excel is stored (excel-result)
         - error: Error message if failed
     """
-    function_url = os.getenv("FUNCTION_APP_URL", "https://func-content-understanding-2220.azurewebsites.net/api")
-    storage_account_name = os.getenv("STORAGE_ACCOUNT_NAME", "demostorageak")
-    
     payload = {
         "ocr_result_blob_name": ocr_result_blob_name,
-        "storage_account_name": storage_account_name
+        "storage_account_name": STORAGE_ACCOUNT_NAME
     }
     
     try:
-        response = requests.post(
-            f"{function_url}/create_excel",
+        response = _SESSION.post(
+            CREATE_EXCEL_URL,
             json=payload,
-            headers={"Content-Type": "application/json"},
             timeout=60
         )
         response.raise_for_status()
@@ -144,6 +262,35 @@ def create_excel(ocr_result_blob_name: str) -> Dict[str, Any]:
         }
 
 
+def parse_ocr_and_create_excel(ocr_result_blob_name: str) -> Dict[str, Any]:
+    """
+    Creates the text summary and the Excel report from OCR results at the same time.
+    
+    Both only read the OCR result, so parse_ocr and create_excel run concurrently.
+    
+    Args:
+        ocr_result_blob_name: Name of the OCR JSON blob in enhanced-results container
+                             (e.g., "claims_sample3.jpg_20251126_180248.json")
+        
+    Returns:
+        Dictionary containing:
+        - success: Boolean indicating if both the summary and the Excel report were created
+        - parse_result: The parse_ocr result (with summary_report_blob_name)
+        - excel_result: The create_excel result (with result_blob_name)
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        parse_future = executor.submit(parse_ocr, ocr_result_blob_name)
+        excel_future = executor.submit(create_excel, ocr_result_blob_name)
+        parse_result = parse_future.result()
+        excel_result = excel_future.result()
+    
+    return {
+        "success": bool(parse_result.get("success") and excel_result.get("success")),
+        "parse_result": parse_result,
+        "excel_result": excel_result
+    }
+
+
 def clean_up(incoming_docs_blob_name: str) -> Dict[str, Any]:
     """
     Moves a processed document from incoming-docs to processed-docs container.
@@ -156,19 +303,15 @@ def clean_up(incoming_docs_blob_name: str) -> Dict[str, Any]:
         - success: Boolean indicating if cleanup was successful
         - message: Success or error message
     """
-    function_url = os.getenv("FUNCTION_APP_URL", "https://func-content-understanding-2220.azurewebsites.net/api")
-    storage_account_name = os.getenv("STORAGE_ACCOUNT_NAME", "demostorageak")
-    
     payload = {
         "incoming_docs_blob_name": incoming_docs_blob_name,
-        "storage_account_name": storage_account_name
+        "storage_account_name": STORAGE_ACCOUNT_NAME
     }
     
     try:
-        response = requests.post(
-            f"{function_url}/clean_up",
+        response = _SESSION.post(
+            CLEAN_UP_URL,
             json=payload,
-            headers={"Content-Type": "application/json"},
             timeout=60
         )
         response.raise_for_status()
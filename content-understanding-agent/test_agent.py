@@ -3,10 +3,11 @@ Test script for the Content Understanding Agent.
 This will test the complete workflow with an existing document.
 """
 import os
-from agent import ContentUnderstandingAgent
+import asyncio
+from agent import ContentUnderstandingAgent, configure_logging
 
 
-def test_agent_workflow():
+async def test_agent_workflow():
     """Test the complete document processing workflow."""
     print("=" * 80)
     print("Testing Content Understanding Agent")
@@ -15,14 +16,14 @@ def test_agent_workflow():
     try:
         # Initialize the agent
         print("\n1️⃣ Initializing agent...")
-        agent = ContentUnderstandingAgent()
+        agent = await ContentUnderstandingAgent.create()
         
         # Test with an existing document
         document_name = "claims_sample3.jpg"
         print(f"\n2️⃣ Processing document: {document_name}")
         print("-" * 80)
         
-        result = agent.process_document(document_name)
+        result = await agent.process_document(document_name)
         
         if result["success"]:
             print("\n✅ Workflow completed successfully!")
@@ -44,12 +45,14 @@ def test_agent_workflow():
             
             for question in test_questions:
                 print(f"\n❓ Question: {question}")
-                answer = agent.query(question, thread_id)
+                answer = await agent.query(question, thread_id)
                 print(f"💬 Answer: {answer}")
                 print("-" * 80)
         else:
             print(f"\n❌ Workflow failed: {result.get('error', 'Unknown error')}")
         
+        await agent.close()
+        
         # Note: Agent persists for reuse across sessions
         print("\n✅ Done! Agent remains active for future use.")
         
@@ -60,4 +63,5 @@ def test_agent_workflow():
 
 
 if __name__ == "__main__":
-    test_agent_workflow()
+    configure_logging()
+    asyncio.run(test_agent_workflow())
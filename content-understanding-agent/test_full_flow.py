@@ -22,15 +22,26 @@ print("=" * 80)
 # Step 1: Upload file to blob
 print("\n1. Uploading file to blob storage...")
 try:
-    credential = DefaultAzureCredential()
+    # Skip credential probes that are never used here, as the app does
+    credential = DefaultAzureCredential(
+        exclude_interactive_browser_credential=True,
+        exclude_visual_studio_code_credential=True,
+        exclude_shared_token_cache_credential=True,
+        exclude_powershell_credential=True
+    )
     blob_service_client = BlobServiceClient(
         account_url=f"https://{STORAGE_ACCOUNT}.blob.core.windows.net",
-        credential=credential
+        credential=credential,
+        # Same upload settings as the app: 4 MB blocks, fail fast on connect
+        max_single_put_size=4 * 1024 * 1024,
+        max_block_size=4 * 1024 * 1024,
+        connection_timeout=10,
+        read_timeout=60
     )
     blob_client = blob_service_client.get_blob_client(container="incoming-docs", blob=BLOB_NAME)
     
     with open(TEST_FILE, "rb") as data:
-        blob_client.upload_blob(data, overwrite=True)
+        blob_client.upload_blob(data, overwrite=True, max_concurrency=8, validate_content=False)
     
     print(f"✅ Uploaded {BLOB_NAME}")
 except Exception as e:
@@ -1,10 +1,53 @@
 """
 Test natural language queries about document data.
 """
-from agent import ContentUnderstandingAgent
+import os
+import asyncio
+import hashlib
+import diskcache
+from agent import ContentUnderstandingAgent, configure_logging
 
+# Reruns ask the same questions about the same document, so answers are kept on disk;
+# set LLM_CACHE=off to always ask the agent
+LLM_CACHE = os.getenv("LLM_CACHE", "exact").lower()
+LLM_CACHE_DIR = ".llm_cache"
 
-def test_natural_language_queries():
+
+def answer_cache_key(agent, document_name: str, question: str) -> str:
+    """Build the answer cache key from the document name, question and model deployment."""
+    # Every run processes the document into a new thread, so the document name stands in for the thread
+    digest = hashlib.sha256(document_name.encode())
+    digest.update(b"\0" + question.encode())
+    digest.update(b"\0" + agent.model_deployment.encode())
+    return digest.hexdigest()
+
+
+async def cached_answers(agent, questions: list[str], thread_id: str, document_name: str, cache) -> list[str]:
+    """
+    Answer the questions in order, reusing stored answers and asking the agent for
+    all of the rest in a single batched run.
+    """
+    answers = {
+        question: cache.get(answer_cache_key(agent, document_name, question)) if cache is not None else None
+        for question in questions
+    }
+    missing = [question for question in questions if answers[question] is None]
+    
+    if missing:
+        fresh = await agent.batch_query(missing, thread_id) if len(missing) > 1 else []
+        if len(fresh) != len(missing):
+            # The batched reply could not be split, so ask each question on its own
+            fresh = [await agent.query(question, thread_id) for question in missing]
+        
+        for question, answer in zip(missing, fresh):
+            answers[question] = answer
+            if cache is not None and not answer.startswith("Error:"):
+                cache.set(answer_cache_key(agent, document_name, question), answer)
+    
+    return [answers[question] for question in questions]
+
+
+async def test_natural_language_queries():
     """Test querying the agent about document details."""
     print("=" * 80)
     print("Testing Natural Language Queries")
@@ -13,14 +56,14 @@ def test_natural_language_queries():
     try:
         # Initialize the agent
         print("\n1️⃣ Initializing agent...")
-        agent = ContentUnderstandingAgent()
+        agent = await ContentUnderstandingAgent.create()
         
         # Process a fresh document
         document_name = "claims_sample2.png"
         print(f"\n2️⃣ Processing document: {document_name}")
         print("-" * 80)
         
-        result = agent.process_document(document_name)
+        result = await agent.process_document(document_name)
         
         if not result["success"]:
             print(f"\n❌ Failed to process document: {result.get('error')}")
@@ -41,13 +84,20 @@ def test_natural_language_queries():
             "What are the defendant details if any are provided?"
         ]
         
-        for i, question in enumerate(questions, 1):
+        cache = diskcache.Cache(LLM_CACHE_DIR) if LLM_CACHE == "exact" else None
+        answers = await cached_answers(agent, questions, thread_id, document_name, cache)
+        
+        for i, (question, answer) in enumerate(zip(questions, answers), 1):
             print(f"\n❓ Question {i}: {question}")
             print("-" * 80)
-            answer = agent.query(question, thread_id)
             print(f"💬 Answer:\n{answer}")
             print("-" * 80)
         
+        if cache is not None:
+            cache.close()
+        
+        await agent.close()
+        
         # Note: Agent persists for reuse
         print("\n✅ Done! Agent remains active for future use.")
         
@@ -58,4 +108,5 @@ def test_natural_language_queries():
 
 
 if __name__ == "__main__":
-    test_natural_language_queries()
+    configure_logging()
+    asyncio.run(test_natural_language_queries())
@@ -0,0 +1,224 @@
+"""
+Async versions of the Azure Function tools in function_tools.py and the
+validation tools in validation_tools.py.
+The agent registers these so that a long OCR call or blob download awaits on the
+shared event loop instead of blocking it for every other run.
+"""
+import asyncio
+import aiohttp
+from typing import Dict, Any, List, Optional
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
+import function_tools
+import validation_tools
+
+# Keep-alive connections and cached DNS lookups shared by every tool call in the process
+HTTP_POOL_SIZE = 32
+DNS_CACHE_TTL_SECONDS = 300
+
+# Throttled and transient statuses worth retrying, as in function_tools. Not 500: the
+# Function App returns it for every failure, and a failed OCR run would just run again
+_RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+_SESSION = None
+
+
+class FunctionCallError(Exception):
+    """An Azure Function answered with a non-2xx status."""
+    
+    def __init__(self, status: int, detail: Any):
+        super().__init__(f"HTTP {status}: {detail}")
+        self.status = status
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """Return the process-wide aiohttp session used for Azure Function calls."""
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        _SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, ttl_dns_cache=DNS_CACHE_TTL_SECONDS),
+            headers={"Content-Type": "application/json"}
+        )
+    return _SESSION
+
+
+def _is_retryable(error: BaseException) -> bool:
+    """
+    Return True for failed connections and throttled / transient HTTP statuses.
+    
+    Timeouts and dropped connections are not retried: the request already reached the
+    function, which may still be running (and billing) the OCR.
+    """
+    if isinstance(error, FunctionCallError):
+        return error.status in _RETRY_STATUSES
+    return isinstance(error, aiohttp.ClientConnectorError)
+
+
+def _tool_doc(sync_tool):
+    """Reuse the sync tool's docstring, which the agent sees as the tool description."""
+    def decorate(func):
+        func.__doc__ = sync_tool.__doc__
+        return func
+    return decorate
+
+
+async def _post(url: str, payload: Dict[str, Any], timeout: int) -> Dict[str, Any]:
+    """POST a payload to an Azure Function endpoint URL from function_tools and return its JSON response."""
+    async for attempt in AsyncRetrying(
+        wait=wait_exponential(multiplier=0.5),
+        stop=stop_after_attempt(3),
+        retry=retry_if_exception(_is_retryable),
+        reraise=True
+    ):
+        with attempt:
+            async with _get_session().post(
+                url,
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                if response.status >= 400:
+                    # Get detailed error from response body
+                    try:
+                        detail = await response.json(content_type=None)
+                    except ValueError:
+                        detail = (await response.text())[:500]
+                    raise FunctionCallError(response.status, detail)
+                return await response.json(content_type=None)
+
+
+@_tool_doc(function_tools.perform_ocr)
+async def perform_ocr(blob_name: str, classifier_id: str = "prebuilt-layout") -> Dict[str, Any]:
+    payload = {
+        "analyzer_id": classifier_id,  # Azure Function expects 'analyzer_id'
+        "blob_url": f"{function_tools.INCOMING_DOCS_URL}/{blob_name}",
+        "storage_account_name": function_tools.STORAGE_ACCOUNT_NAME
+    }
+    
+    try:
+        return await _post(function_tools.PERFORM_OCR_URL, payload, timeout=300)  # 5 minutes for OCR processing
+    except FunctionCallError as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"{type(e).__name__}: {str(e)}"
+        }
+
+
+@_tool_doc(function_tools.process_document_full)
+async def process_document_full(blob_name: str, classifier_id: str = "prebuilt-layout") -> Dict[str, Any]:
+    payload = {
+        "analyzer_id": classifier_id,  # Azure Function expects 'analyzer_id'
+        "blob_url": f"{function_tools.INCOMING_DOCS_URL}/{blob_name}",
+        "storage_account_name": function_tools.STORAGE_ACCOUNT_NAME
+    }
+    
+    try:
+        return await _post(function_tools.PROCESS_DOCUMENT_FULL_URL, payload, timeout=360)  # OCR plus both reports
+    except FunctionCallError as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"{type(e).__name__}: {str(e)}"
+        }
+
+
+@_tool_doc(function_tools.perform_ocr_parallel)
+async def perform_ocr_parallel(blob_names: List[str], classifier_id: str = "prebuilt-layout") -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(function_tools.OCR_MAX_WORKERS)
+    
+    async def ocr_one(blob_name: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await perform_ocr(blob_name, classifier_id)
+    
+    results = await asyncio.gather(*(ocr_one(blob_name) for blob_name in blob_names))
+    
+    return {
+        "success": all(result.get("success") for result in results),
+        "results": list(results)
+    }
+
+
+@_tool_doc(function_tools.parse_ocr)
+async def parse_ocr(ocr_result_blob_name: str) -> Dict[str, Any]:
+    payload = {
+        "ocr_result_blob_name": ocr_result_blob_name,
+        "storage_account_name": function_tools.STORAGE_ACCOUNT_NAME
+    }
+    
+    try:
+        return await _post(function_tools.PARSE_OCR_URL, payload, timeout=60)
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+@_tool_doc(function_tools.create_excel)
+async def create_excel(ocr_result_blob_name: str) -> Dict[str, Any]:
+    payload = {
+        "ocr_result_blob_name": ocr_result_blob_name,
+        "storage_account_name": function_tools.STORAGE_ACCOUNT_NAME
+    }
+    
+    try:
+        return await _post(function_tools.CREATE_EXCEL_URL, payload, timeout=60)
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+@_tool_doc(function_tools.parse_ocr_and_create_excel)
+async def parse_ocr_and_create_excel(ocr_result_blob_name: str) -> Dict[str, Any]:
+    parse_result, excel_result = await asyncio.gather(
+        parse_ocr(ocr_result_blob_name),
+        create_excel(ocr_result_blob_name)
+    )
+    
+    return {
+        "success": bool(parse_result.get("success") and excel_result.get("success")),
+        "parse_result": parse_result,
+        "excel_result": excel_result
+    }
+
+
+@_tool_doc(function_tools.clean_up)
+async def clean_up(incoming_docs_blob_name: str) -> Dict[str, Any]:
+    payload = {
+        "incoming_docs_blob_name": incoming_docs_blob_name,
+        "storage_account_name": function_tools.STORAGE_ACCOUNT_NAME
+    }
+    
+    try:
+        return await _post(function_tools.CLEAN_UP_URL, payload, timeout=60)
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+# The validation tools use the sync blob client and wait on downloads, so they run in a
+# worker thread instead of blocking the shared event loop
+@_tool_doc(validation_tools.get_ocr_result_content)
+async def get_ocr_result_content(ocr_result_blob_name: str) -> Dict[str, Any]:
+    return await asyncio.to_thread(validation_tools.get_ocr_result_content, ocr_result_blob_name)
+
+
+@_tool_doc(validation_tools.get_parsed_summary_content)
+async def get_parsed_summary_content(summary_blob_name: str, max_bytes: Optional[int] = None) -> Dict[str, Any]:
+    return await asyncio.to_thread(validation_tools.get_parsed_summary_content, summary_blob_name, max_bytes)
+
+
+@_tool_doc(validation_tools.validate_ocr_and_parse)
+async def validate_ocr_and_parse(ocr_result_blob_name: str, summary_blob_name: str) -> Dict[str, Any]:
+    return await asyncio.to_thread(validation_tools.validate_ocr_and_parse, ocr_result_blob_name, summary_blob_name)
@@ -14,6 +14,18 @@ from datetime import datetime, timezone, timedelta
 
 app = func.FunctionApp()
 
+@app.route(route="warmup", auth_level=func.AuthLevel.ANONYMOUS)
+def warmup(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Azure Function the client pings at startup to bring the host up before
+    the first document is processed; it does no work and returns immediately
+    """
+    return func.HttpResponse(
+        json.dumps({"success": True}),
+        status_code=200,
+        mimetype="application/json"
+    )
+
 @app.route(route="perform_ocr", auth_level=func.AuthLevel.ANONYMOUS)
 def perform_ocr(req: func.HttpRequest) -> func.HttpResponse:
     """
@@ -211,9 +223,120 @@ def perform_ocr_processing(classifier_id: str, blob_url: str, storage_account_na
     
     return {
         "blob_name": ocr_result_blob_name,
-        "container_name": container_name
+        "container_name": container_name,
+        # handed back so process_document_full can build its reports without downloading it again
+        "ocr_result_json": ocr_result_json
     }
 
+@app.route(route="process_document_full", auth_level=func.AuthLevel.ANONYMOUS)
+def process_document_full(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Azure Function to run the whole document pipeline in one request:
+    OCR, then the summary report and the excel report from the OCR result
+    (the same work as perform_ocr, parse_ocr and create_excel, without the
+    two extra round trips or the OCR result download)
+    
+    Expected parameters:
+    - classifier_id OR analyzer_id: The classifier/analyzer ID to use for document processing
+    - blob_url: URL of the blob to process
+    - storage_account_name: Name of the storage account for results
+    """
+    logging.info('Python HTTP trigger function processed a request.')
+
+    try:
+        # Get parameters from request
+        classifier_id = req.params.get('classifier_id') or req.params.get('analyzer_id')
+        blob_url = req.params.get('blob_url')
+        storage_account_name = req.params.get('storage_account_name')
+        
+        # Try to get parameters from request body if not in query string
+        if not all([classifier_id, blob_url, storage_account_name]):
+            try:
+                req_body = req.get_json()
+                if req_body:
+                    classifier_id = classifier_id or req_body.get('classifier_id') or req_body.get('analyzer_id')
+                    blob_url = blob_url or req_body.get('blob_url')
+                    storage_account_name = storage_account_name or req_body.get('storage_account_name')
+            except ValueError:
+                pass
+        
+        # Validate required parameters
+        if not all([classifier_id, blob_url, storage_account_name]):
+            return func.HttpResponse(
+                json.dumps({
+                    "error": "Missing required parameters",
+                    "message": "classifier_id (or analyzer_id), blob_url, and storage_account_name are required"
+                }),
+                status_code=400,
+                mimetype="application/json"
+            )
+        
+        # Run OCR; the result JSON stays in memory for the two reports
+        ocr_result = perform_ocr_processing(classifier_id, blob_url, storage_account_name)
+        ocr_result_json = ocr_result["ocr_result_json"]
+        ocr_result_blob_name = ocr_result["blob_name"]
+
+        # Get configuration from environment variables
+        client_id = os.getenv("AZURE_CLIENT_ID")
+        client_secret = os.getenv("AZURE_CLIENT_SECRET")
+        tenant_id = os.getenv("AZURE_TENANT_ID")
+        credential = ClientSecretCredential(tenant_id, client_id, client_secret)
+
+        # Both reports only read the OCR result, so write them concurrently
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            summary_future = executor.submit(produce_summary_report, ocr_result_json, storage_account_name, ocr_result_blob_name, credential)
+            excel_future = executor.submit(produce_excel_report, ocr_result_json, storage_account_name, ocr_result_blob_name)
+            summary_result = summary_future.result() or {}
+            excel_result = excel_future.result() or {}
+
+        # Both report helpers log and swallow their errors; only an uploaded report comes back
+        # with success set (a failed upload still returns the blob name it meant to write)
+        failed_reports = []
+        if not summary_result.get("success"):
+            failed_reports.append("summary report")
+        if not excel_result.get("success"):
+            failed_reports.append("excel report")
+
+        if failed_reports:
+            return func.HttpResponse(
+                json.dumps({
+                    "success": False,
+                    "error": f"Failed to create the {' and '.join(failed_reports)}; retry with parse_ocr / create_excel",
+                    "ocr_result_blob_name": ocr_result_blob_name,
+                    "ocr_container_name": ocr_result.get("container_name")
+                }),
+                # OCR succeeded, so answer normally and let the caller retry just the failed report
+                status_code=200,
+                mimetype="application/json"
+            )
+
+        return func.HttpResponse(
+            json.dumps({
+                "success": True,
+                "message": "Document processed successfully",
+                "ocr_result_blob_name": ocr_result_blob_name,
+                "ocr_container_name": ocr_result.get("container_name"),
+                "summary_report_blob_name": summary_result.get("summary_report_blob_name"),
+                "summary_container_name": summary_result.get("summary_container_name"),
+                "excel_blob_name": excel_result.get("blob_name"),
+                "excel_container_name": excel_result.get("container_name")
+            }),
+            status_code=200,
+            mimetype="application/json"
+        )
+        
+    except Exception as e:
+        logging.error(f"Error in process_document_full: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({
+                "success": False,
+                "error": str(e)
+            }),
+            status_code=500,
+            mimetype="application/json"
+        )
+
 @app.route(route="create_excel", auth_level=func.AuthLevel.ANONYMOUS)
 def create_excel(req: func.HttpRequest) -> func.HttpResponse:
     """
@@ -329,7 +452,8 @@ def produce_excel_report(ocr_result_json, storage_account_name, ocr_blob_name):
     Create an Excel report from the ocr_result_json data with patient info, 
     document listings, and collapsible expense rows.
     and writes the report to a blob file in Azure storage
-    Returns the blob name and container name of the uploaded excel file
+    Returns the blob name and container name of the uploaded excel file,
+    with success set to False if the upload failed
     """
     import openpyxl
     from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
@@ -641,6 +765,7 @@ def produce_excel_report(ocr_result_json, storage_account_name, ocr_blob_name):
 
         # return the excel blob name and container name
         return {
+            "success": True,
             "blob_name": excel_blob_name,
             "container_name": excel_container_name
         }
@@ -657,6 +782,7 @@ def produce_excel_report(ocr_result_json, storage_account_name, ocr_blob_name):
         if excel_container_name is None:
             excel_container_name = "unknown_due_to_error"
         return {
+            "success": False,
             "blob_name": excel_blob_name,
             "container_name": excel_container_name
         }
@@ -859,6 +985,8 @@ def parse_ocr(req: func.HttpRequest) -> func.HttpResponse:
 def produce_summary_report(ocr_result_json, storage_account_name, ocr_blob_name, credential):   
     """
     Display a concise summary of the document analysis results.
+    Returns the blob name and container name of the uploaded summary report,
+    with success set to False if the upload failed
     """
     try:
         data = ocr_result_json
@@ -961,6 +1089,7 @@ def produce_summary_report(ocr_result_json, storage_account_name, ocr_blob_name,
 
         # return the summary report blob name and container name
         return {
+            "success": True,
             "summary_report_blob_name": summary_report_blob_name,
             "summary_container_name": summary_container_name
         }
@@ -977,6 +1106,7 @@ def produce_summary_report(ocr_result_json, storage_account_name, ocr_blob_name,
         if summary_container_name is None:
             summary_container_name = "unknown_due_to_error"
         return {
+            "success": False,
             "summary_report_blob_name": summary_report_blob_name,
             "summary_container_name": summary_container_name
         }